@@ -1,3 +1,43 @@
+import os
+import tempfile
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
 from django.test import TestCase
 
-# Create your tests here.
+
+class CreateUsersFromCsvTests(TestCase):
+    def _run(self, rows, verbosity=1):
+        fd, path = tempfile.mkstemp(suffix=".csv")
+        self.addCleanup(os.remove, path)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(rows)
+        out = StringIO()
+        call_command("create_users_from_csv", path, workers=1, verbosity=verbosity, stdout=out)
+        return out.getvalue()
+
+    def test_blank_usernames_are_skipped(self):
+        out = self._run(",\n ,pw\nalice,pw\n")
+        self.assertEqual(list(User.objects.values_list("username", flat=True)), ["alice"])
+        self.assertEqual(out.count("Skipped a row without a username"), 2)
+
+    def test_usernames_are_normalised(self):
+        self._run("ａlice,pw\n")  # fullwidth "a"
+        self.assertTrue(User.objects.filter(username="alice").exists())
+
+
+    def test_duplicate_rows_create_one_user(self):
+        self._run("alice,first\nalice,second\n")
+        self.assertEqual(User.objects.filter(username="alice").count(), 1)
+        self.assertTrue(User.objects.get(username="alice").check_password("first"))
+
+    def test_existing_users_are_left_alone(self):
+        User.objects.create_user("alice", password="old")
+        out = self._run("alice,new\nbob,pw\n", verbosity=2)
+
+        self.assertTrue(User.objects.get(username="alice").check_password("old"))
+        self.assertTrue(User.objects.get(username="bob").check_password("pw"))
+        self.assertIn("User alice already exists", out)
+        self.assertIn("Created bob", out)
+        self.assertIn("Created 1 users, skipped 1 existing", out)
@@ -1,28 +1,103 @@
 from django.contrib import admin
-from django.http import HttpResponse
+from django.core.cache import cache
+from django.core.exceptions import PermissionDenied
+from django.http import Http404, HttpResponse
+from django.shortcuts import get_object_or_404
+from django.urls import path, reverse
 import csv
+import io
+import os
 from .models import Conversation, Prompt, ChatSetting
 from django.utils.html import format_html 
 
+# cleared by the post_save/post_delete receivers in signals.py
+PROMPT_COUNT_CACHE_KEY = "admin::prompt_count"
+CHAT_SETTING_EXISTS_CACHE_KEY = "admin::chat_setting_exists"
+
+
+def _prompt_slots_left():
+    return cache.get_or_set(PROMPT_COUNT_CACHE_KEY, Prompt.objects.count, 30) < 2
+
+
+def _chat_setting_exists():
+    return cache.get_or_set(CHAT_SETTING_EXISTS_CACHE_KEY, ChatSetting.objects.exists, 30)
+
+
+def _is_click_row(row):
+    return len(row) == 5 and row[4] == "true" and not any(row[1:4])
+
+
+def resolved_log_rows(fp):
+    """
+    CSV rows with one row per advice again.
+    The log is append-only, so a click is written as its own
+    "<time>,,,,true" row (see views.coach_clicked); here it is folded
+    into the latest advice row above it.
+    """
+    rows = []
+    last_advice = None
+    for row in csv.reader(fp):
+        if _is_click_row(row):
+            if last_advice is not None:
+                last_advice[4] = "true"
+            continue
+        if len(row) == 5 and row[3]:
+            last_advice = row
+        rows.append(row)
+    return rows
+
 
 @admin.register(Conversation)
 class ConversationAdmin(admin.ModelAdmin):
     list_display   = ("user", "started_at", "log_link")
+    list_select_related = ("user",)
     date_hierarchy = "started_at"
     list_filter    = ("user",)
 
+    def get_urls(self):
+        return [
+            path(
+                "<int:pk>/log.csv",
+                self.admin_site.admin_view(self.download_log),
+                name="sales_chat_conversation_log",
+            ),
+            *super().get_urls(),
+        ]
+
+    def _log_exists(self, obj):
+        # the name is reserved at session start, the file only appears
+        # with the first logged row
+        return bool(obj.log_file) and obj.log_file.storage.exists(obj.log_file.name)
+
     @admin.display(description="Transcript")
     def log_link(self, obj):
         """
         Renders a safe HTML link if the CSV exists.
         """
-        if obj.log_file:
+        if self._log_exists(obj):
             return format_html(
                 "<a href='{}' download>Download CSV</a>",
-                obj.log_file.url,
+                reverse("admin:sales_chat_conversation_log", args=[obj.pk]),
             )
         return "–"
 
+    def download_log(self, request, pk):
+        """The transcript CSV with click rows folded into their advice rows."""
+        conv = get_object_or_404(Conversation, pk=pk)
+        if not self.has_view_permission(request, conv):
+            raise PermissionDenied
+        if not self._log_exists(conv):
+            raise Http404("No transcript yet")
+
+        with conv.log_file.open("rb") as fp:
+            rows = resolved_log_rows(io.TextIOWrapper(fp, encoding="utf-8", newline=""))
+        response = HttpResponse(content_type="text/csv")
+        response["Content-Disposition"] = (
+            f'attachment; filename="{os.path.basename(conv.log_file.name)}"'
+        )
+        csv.writer(response).writerows(rows)
+        return response
+
 
 @admin.register(Prompt)
 class PromptAdmin(admin.ModelAdmin):
@@ -37,7 +112,7 @@ class PromptAdmin(admin.ModelAdmin):
 
     def has_add_permission(self, request):
         # Only allow adding prompts if there are less than 2
-        return Prompt.objects.count() < 2
+        return _prompt_slots_left()
 
     def has_delete_permission(self, request, obj=None):
         return False
@@ -58,4 +133,4 @@ class PromptAdmin(admin.ModelAdmin):
 class ChatSettingAdmin(admin.ModelAdmin):
     # there will normally be just one row, so hide the “Add” button
     def has_add_permission(self, request):
-        return not ChatSetting.objects.exists()
+        return not _chat_setting_exists()
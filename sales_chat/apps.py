@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class SalesChatConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'sales_chat'
+
+    def ready(self):
+        from . import signals  # noqa: F401  (registers receivers)
@@ -0,0 +1,20 @@
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .admin import CHAT_SETTING_EXISTS_CACHE_KEY, PROMPT_COUNT_CACHE_KEY
+from .models import ChatSetting, Prompt
+from .utils import clear_session_duration_cache
+from .utils_prompt import clear_prompt_cache
+
+
+@receiver([post_save, post_delete], sender=Prompt)
+def _prompt_changed(sender, **kwargs):
+    clear_prompt_cache()
+    cache.delete(PROMPT_COUNT_CACHE_KEY)
+
+
+@receiver([post_save, post_delete], sender=ChatSetting)
+def _chat_setting_changed(sender, **kwargs):
+    clear_session_duration_cache()
+    cache.delete(CHAT_SETTING_EXISTS_CACHE_KEY)
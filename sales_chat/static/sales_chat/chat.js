@@ -1,5 +1,6 @@
 /* sales_chat/static/sales_chat/chat.js
    — sessions, 20‑min timer, typing indicator, coach tab, clicked logging
+   — customer reply + coach advice streamed from one request (SSE over POST)
    — REWRITTEN to enforce a single (non‑restartable) session
    — MODIFIED to block copy/paste/cut in the textarea
 */
@@ -149,7 +150,8 @@ document.addEventListener("DOMContentLoaded", () => {
         credentials: "same-origin",
       });
 
-      if (resp.status === 403) {
+      // 409 is the server saying "already done"; a 403 is a CSRF failure
+      if (resp.status === 409) {
         alert("This exercise is complete – you can’t start it again.");
         permanentlyHideStart();
         return;
@@ -212,22 +214,45 @@ document.addEventListener("DOMContentLoaded", () => {
       '<em class="typing-indicator typing-dots">is typing…</em>'
     );
 
-    const formData = new FormData();
-    formData.append("query", userText);
-    formData.append("csrfmiddlewaretoken", csrfToken);
-
     try {
-      const resp = await fetch("/chat/stream/", {
+      const resp = await fetch("/chat/turn/", {
         method: "POST",
-        body: formData,
+        body: JSON.stringify({ query: userText }),
         credentials: "same-origin",
-        headers: { Accept: "application/json" },
+        headers: {
+          "X-CSRFToken": csrfToken,
+          "Content-Type": "application/json",
+          Accept: "text/event-stream",
+        },
       });
 
-      if (resp.status === 403) { finishSession(); return; }
+      if (resp.status === 409) { finishSession(); return; }  // time is up
       if (!resp.ok) throw new Error(resp.status);
 
-      const { answer } = await resp.json();
+      // server‑sent events over the POST response: "data: {...}\n\n"
+      const reader  = resp.body.getReader();
+      const decoder = new TextDecoder();
+      let pending = "";
+      let answer  = "";
+      for (;;) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        pending += decoder.decode(value, { stream: true });
+        const events = pending.split("\n\n");
+        pending = events.pop();
+        for (const evt of events) {
+          if (!evt.startsWith("data: ")) continue;
+          const data = JSON.parse(evt.slice(6));
+          if (data.error) throw new Error(data.error);
+          if ("advice" in data) {  // coach runs in parallel, arrives last
+            showCoachAdvice(data.advice);
+            continue;
+          }
+          answer += data.t || "";
+          typingElem.innerHTML = `<strong>Customer:</strong> ${answer}`;
+          scrollToBottom(chatBox);
+        }
+      }
       typingElem.innerHTML = `<strong>Customer:</strong> ${answer || "[empty]"}`;
     } catch (err) {
       typingElem.innerHTML = `<span class="text-danger">[error]</span>`;
@@ -235,21 +260,5 @@ document.addEventListener("DOMContentLoaded", () => {
     }
 
     enableChat(true);
-
-    // --- coach advice ------------------------------------------
-    try {
-      await new Promise((r) => setTimeout(r, 400));
-      const coachResp = await fetch("/chat/coach/", {
-        method: "POST",
-        headers: { "X-CSRFToken": csrfToken, Accept: "application/json" },
-        credentials: "same-origin",
-      });
-      if (coachResp.status === 403) { finishSession(); return; }
-
-      const { advice } = await coachResp.json();
-      showCoachAdvice(advice);
-    } catch (err) {
-      console.error("coach error:", err);
-    }
   });
 });
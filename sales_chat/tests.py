@@ -1,3 +1,404 @@
-from django.test import TestCase
+import csv
+import io
+import shutil
+import tempfile
+import time
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from django.contrib import admin
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import Client, RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from voice_assistant_project.middleware import StreamFriendlyGZipMiddleware
+
+from . import views
+from .admin import ConversationAdmin
+from .models import ChatSetting, Conversation, Prompt
+from .utils import clear_session_duration_cache, get_session_duration
+from .utils_prompt import PROMPT_CACHE_KEY, clear_prompt_cache, get_prompt
+
+
+class StreamFriendlyGZipTests(SimpleTestCase):
+    def _process(self, response):
+        request = RequestFactory().get("/", HTTP_ACCEPT_ENCODING="gzip")
+        middleware = StreamFriendlyGZipMiddleware(lambda r: response)
+        return middleware(request)
+
+    def test_event_stream_is_not_compressed(self):
+        events = (b"data: %d\n\n" % i for i in range(3))
+        response = self._process(
+            StreamingHttpResponse(events, content_type="text/event-stream")
+        )
+        self.assertFalse(response.has_header("Content-Encoding"))
+        self.assertEqual(next(iter(response.streaming_content)), b"data: 0\n\n")
+
+    def test_other_responses_are_still_compressed(self):
+        response = self._process(HttpResponse(b"x" * 1000))
+        self.assertEqual(response["Content-Encoding"], "gzip")
+
+
+class SharedCacheTests(TestCase):
+    def setUp(self):
+        clear_prompt_cache()
+        clear_session_duration_cache()
+        cache.clear()
+
+    def test_prompt_is_cached_until_saved(self):
+        prompt = Prompt.objects.create(key=Prompt.Keys.COACH, content="v1")
+        self.assertEqual(get_prompt("COACH_PROMPT", "default"), "v1")
+        with self.assertNumQueries(0):
+            self.assertEqual(get_prompt("COACH_PROMPT", "default"), "v1")
+
+        prompt.content = "v2"
+        prompt.save()
+        self.assertEqual(get_prompt("COACH_PROMPT", "default"), "v2")
+
+        prompt.delete()
+        self.assertEqual(get_prompt("COACH_PROMPT", "default"), "default")
+
+    def test_session_duration_is_cached_until_saved(self):
+        setting = ChatSetting.objects.create(session_duration=300)
+        self.assertEqual(get_session_duration(), 300)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_session_duration(), 300)
+
+        setting.session_duration = 600
+        setting.save()
+        self.assertEqual(get_session_duration(), 600)
+
+    def test_other_workers_pick_up_a_change_within_the_ttl(self):
+        Prompt.objects.create(key=Prompt.Keys.COACH, content="v1")
+        self.assertEqual(get_prompt("COACH_PROMPT", "default"), "v1")
+
+        # saved in another worker: its receiver only cleared the shared cache
+        Prompt.objects.update(content="v2")
+        cache.delete(PROMPT_CACHE_KEY.format("COACH_PROMPT"))
+        self.assertEqual(get_prompt("COACH_PROMPT", "default"), "v1")
+
+        later = time.monotonic() + 61
+        with mock.patch("sales_chat.utils_prompt.time.monotonic", return_value=later):
+            self.assertEqual(get_prompt("COACH_PROMPT", "default"), "v2")
+
+    @override_settings(CACHE_IS_SHARED=False)
+    def test_per_process_cache_entries_expire(self):
+        Prompt.objects.create(key=Prompt.Keys.COACH, content="v1")
+        self.assertEqual(get_prompt("COACH_PROMPT", "default"), "v1")
+
+        # saved in another worker: nothing here was invalidated
+        Prompt.objects.update(content="v2")
+        later = time.monotonic() + 61
+        with mock.patch("sales_chat.utils_prompt.time.monotonic", return_value=later), \
+                mock.patch("time.time", return_value=time.time() + 61):
+            self.assertEqual(get_prompt("COACH_PROMPT", "default"), "v2")
+
+
+def _completion(text):
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=text))])
+
+
+class FakeCompletions:
+    """Stands in for client.chat.completions; numbers the customer replies."""
+
+    def __init__(self):
+        self.customer_calls = []
+        self.summary_fails = False
+        self.coach_calls = 0
+        self.coach_answer = "NO_ADVICE"
+
+    def create(self, **kwargs):
+        if kwargs.get("stream"):
+            self.customer_calls.append(kwargs["messages"])
+            text = f"<r{len(self.customer_calls)}>"
+            delta = SimpleNamespace(delta=SimpleNamespace(content=text))
+            return iter([SimpleNamespace(choices=[delta])])
+        if kwargs["model"] == "gpt-4.1-mini":  # summary: keep everything it was given
+            if self.summary_fails:
+                raise RuntimeError("summary model unavailable")
+            return _completion(kwargs["messages"][-1]["content"])
+        self.coach_calls += 1
+        return _completion(self.coach_answer)
+
+
+class ChatTurnTests(TestCase):
+    def setUp(self):
+        clear_prompt_cache()
+        clear_session_duration_cache()
+        cache.clear()
+        views._HISTORY_CACHE.clear()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root))
+
+        self.completions = FakeCompletions()
+        client = SimpleNamespace(chat=SimpleNamespace(completions=self.completions))
+        self.enterContext(mock.patch.object(views, "get_openai_client", lambda: client))
+        # write CSV rows right away instead of from the background thread
+        self.enterContext(mock.patch.object(views, "_enqueue_rows", views._append_rows))
+        self.addCleanup(views._close_all_logs)
+
+        ChatSetting.objects.create(session_duration=600)
+        self.client.force_login(User.objects.create_user("seller"))
+        self.client.post(reverse("sales_chat:chat-start"))
+
+    def _turn(self, text):
+        response = self.client.post(reverse("sales_chat:chat_turn"), {"query": text})
+        return b"".join(response.streaming_content)
+
+    def test_every_earlier_message_reaches_the_customer(self):
+        for turn in range(1, 31):
+            self._turn(f"<m{turn}> what about the price")
+            prompt = "\n".join(m["content"] for m in self.completions.customer_calls[-1])
+            for earlier in range(1, turn):
+                self.assertIn(f"<m{earlier}>", prompt, f"turn {turn}")
+                self.assertIn(f"<r{earlier}>", prompt, f"turn {turn}")
+
+        # the summary took over the old turns – the prompt did not keep growing
+        dialogue = self.completions.customer_calls[-1][2:]
+        self.assertLessEqual(len(dialogue), views.HISTORY_WINDOW + views.SUMMARY_CHUNK + 1)
+
+    def test_failed_summaries_lose_no_messages(self):
+        self.completions.summary_fails = True
+        for turn in range(1, 20):
+            self._turn(f"<m{turn}> what about the price")
+        self.assertIsNone(self.client.session.get("history_summary"))
+
+        self.completions.summary_fails = False
+        for turn in range(20, 23):
+            self._turn(f"<m{turn}> what about the price")
+        prompt = "\n".join(m["content"] for m in self.completions.customer_calls[-1])
+        for earlier in range(1, 22):
+            self.assertIn(f"<m{earlier}>", prompt)
+            self.assertIn(f"<r{earlier}>", prompt)
+
+    def test_repeated_sentence_in_a_new_context_is_coached_again(self):
+        self._turn("what about the price")
+        self._turn("what about the price")
+        self.assertEqual(self.completions.coach_calls, 2)
+
+    def test_polling_an_unchanged_dialogue_reuses_the_advice(self):
+        self._turn("what about the price")
+        calls = self.completions.coach_calls
+        self.client.post(reverse("sales_chat:coach"))
+        self.client.post(reverse("sales_chat:coach"))
+        self.assertEqual(self.completions.coach_calls, calls + 1)
+
+    def _post_json(self, body):
+        return self.client.post(reverse("sales_chat:chat_turn"), body, content_type="application/json")
+
+    def test_json_body_is_read(self):
+        response = self._post_json(b'{"query": " what about the price "}')
+        self.assertIn(b"<r1>", b"".join(response.streaming_content))
+        self.assertEqual(self.completions.customer_calls[-1][-1]["content"], "what about the price")
+
+    def test_bad_json_bodies_are_rejected(self):
+        for body in (b"{not json", b"[1]", b'"price"', b'{"query": 5}', b'{"query": ["price"]}', b"{}"):
+            with self.subTest(body=body):
+                response = self._post_json(body)
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.json(), {"error": "empty"})
+        self.assertEqual(self.completions.customer_calls, [])
+
+    def test_posts_need_a_csrf_token(self):
+        browser = Client(enforce_csrf_checks=True)
+        browser.force_login(User.objects.create_user("buyer"))
+        start, turn = reverse("sales_chat:chat-start"), reverse("sales_chat:chat_turn")
+        body = b'{"query": "what about the price"}'
+
+        self.assertEqual(browser.post(start).status_code, 403)
+        browser.get(reverse("sales_chat:chat_room"))
+        token = browser.cookies["csrftoken"].value
+        self.assertEqual(browser.post(start, HTTP_X_CSRFTOKEN=token).status_code, 200)
+
+        self.assertEqual(browser.post(turn, body, content_type="application/json").status_code, 403)
+        response = browser.post(turn, body, content_type="application/json", HTTP_X_CSRFTOKEN=token)
+        self.assertIn(b"<r1>", b"".join(response.streaming_content))
+
+    def test_finished_sessions_answer_409(self):
+        self.client.post(reverse("sales_chat:chat-end"))
+
+        for name in ("chat_turn", "coach", "coach-clicked"):
+            with self.subTest(name=name):
+                response = self.client.post(reverse(f"sales_chat:{name}"), {"query": "price"})
+                self.assertEqual(response.status_code, 409)
+                self.assertEqual(response.json(), {"error": "inactive"})
+        response = self.client.post(reverse("sales_chat:chat-start"))
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json(), {"error": "already-finished"})
+
+    def _log_rows(self):
+        with open(self.client.session["chat_log_path"], newline="", encoding="utf-8") as fp:
+            return list(csv.reader(fp))
+
+    def _click(self):
+        return self.client.post(reverse("sales_chat:coach-clicked"))
+
+    def test_click_without_advice_is_rejected(self):
+        self._turn("what about the price")  # coach says NO_ADVICE
+        self.assertEqual(self._click().status_code, 400)
+
+    def test_click_is_logged_once_and_folded_into_the_advice_row(self):
+        self.completions.coach_answer = "Ask about budget."
+        self._turn("what about the price")
+        self.assertEqual(self._click().status_code, 200)
+        self.assertEqual(self._click().status_code, 200)
+
+        raw = self._log_rows()
+        self.assertEqual(raw[-2][3:], ["Ask about budget.", "false"])
+        self.assertEqual(raw[-1][1:], ["", "", "", "true"])
+        self.assertEqual(len(raw), 5)  # header, sales, customer, advice, one click
+
+        staff = Client()
+        staff.force_login(User.objects.create_superuser("admin"))
+        conv = Conversation.objects.get()
+        response = staff.get(reverse("admin:sales_chat_conversation_log", args=[conv.pk]))
+        exported = list(csv.reader(io.StringIO(response.content.decode())))
+        self.assertEqual(exported[-1][3:], ["Ask about budget.", "true"])
+        self.assertEqual(len(exported), 4)
+
+    def test_click_on_reshown_advice_is_logged(self):
+        self.completions.coach_answer = "Ask about budget."
+        self._turn("what about the price")
+        self._click()
+        # the same advice comes back from the memo on the next poll
+        response = self.client.post(reverse("sales_chat:coach"))
+        self.assertEqual(response.json()["advice"], "Ask about budget.")
+        self._click()
+
+        self.assertEqual(sum(row[4] == "true" for row in self._log_rows()), 2)
+
+    def test_turns_logged_by_another_worker_are_picked_up(self):
+        self._turn("<m1> what about the price")
+        # another worker handled a turn: its messages are only in the log
+        path = views._msgs_path(SimpleNamespace(session=self.client.session))
+        with open(path, "ab") as fp:
+            fp.write(b'{"role":"user","content":"<m2> elsewhere"}\n')
+            fp.write(b'{"role":"assistant","content":"<r2> elsewhere"}\n')
+
+        self._turn("<m3> what about the price")
+        contents = [m["content"] for m in self.completions.customer_calls[-1][1:]]
+        self.assertEqual(
+            contents,
+            ["<m1> what about the price", "<r1>", "<m2> elsewhere", "<r2> elsewhere",
+             "<m3> what about the price"],
+        )
+
+    def test_session_is_saved_before_the_advice_event(self):
+        response = self.client.post(
+            reverse("sales_chat:chat_turn"), {"query": "what about the price"}
+        )
+        events = iter(response.streaming_content)
+        next(events)  # customer reply
+        self.assertIn(b'"advice"', next(events))
+        response.close()  # client gone before the stream finished
+
+        self.assertIn("coach_key", self.client.session)
+
+
+class ConversationAdminTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root))
+
+    def test_log_link_only_for_written_logs(self):
+        conv = Conversation(user=User.objects.create_user("seller"))
+        conv.log_file.name = "chat_logs/seller/seller.csv"
+        conv.save()
+        model_admin = ConversationAdmin(Conversation, admin.site)
+        self.assertEqual(model_admin.log_link(conv), "–")
+
+        conv.log_file.storage.save(conv.log_file.name, ContentFile(b"header\n"))
+        self.assertIn("Download CSV", model_admin.log_link(conv))
+
+
+class EncodeRowTests(SimpleTestCase):
+    def test_matches_csv_writer(self):
+        rows = [
+            ["12:00:00", "plain", "", "", "false"],
+            ["12:00:01", "a, b", 'say "hi"', "line\nbreak", ""],
+            ["12:00:02", "cr\ronly", '"', ",", "crlf\r\nend"],
+            ["12:00:03", " spaced ", "ünïcode – ok", "'single'", "true"],
+        ]
+        for row in rows:
+            expected = io.StringIO()
+            csv.writer(expected).writerow(row)
+            self.assertEqual(views._encode_row(row), expected.getvalue())
+
+
+
+class HistoryStoreTests(SimpleTestCase):
+    def setUp(self):
+        views._HISTORY_CACHE.clear()
+        log_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, log_dir, ignore_errors=True)
+        self.request = SimpleNamespace(session={"chat_log_path": f"{log_dir}/seller.csv"})
+
+    def test_append_then_load_uses_memory(self):
+        first = {"role": "user", "content": "hello"}
+        second = {"role": "assistant", "content": "hi"}
+        views._append_history(self.request, first, second)
+
+        with mock.patch("builtins.open", side_effect=AssertionError("file re-read")):
+            count, history = views._load_history(self.request)
+        self.assertEqual((count, list(history)), (2, [first, second]))
+
+    def test_reloads_when_another_worker_appended(self):
+        views._append_history(self.request, {"role": "user", "content": "hello"})
+        with open(views._msgs_path(self.request), "ab") as fp:
+            fp.write(b'{"role":"assistant","content":"from elsewhere"}\n')
+
+        count, history = views._load_history(self.request)
+        self.assertEqual(count, 2)
+        self.assertEqual(history[-1]["content"], "from elsewhere")
+
+    def test_ignores_a_line_still_being_written(self):
+        views._append_history(self.request, {"role": "user", "content": "hello"})
+        with open(views._msgs_path(self.request), "ab") as fp:
+            fp.write(b'{"role":"assistant","con')
+
+        count, history = views._load_history(self.request)
+        self.assertEqual((count, len(history)), (1, 1))
+
+    def test_keeps_only_the_newest_messages(self):
+        for i in range(views.HISTORY_MAX + 5):
+            views._append_history(self.request, {"role": "user", "content": str(i)})
+        views._HISTORY_CACHE.clear()  # force a read from the log
+
+        count, history = views._load_history(self.request)
+        self.assertEqual(count, views.HISTORY_MAX + 5)
+        self.assertEqual(len(history), views.HISTORY_MAX)
+        self.assertEqual(history[-1]["content"], str(views.HISTORY_MAX + 4))
+
+
+class CoachMemoTests(SimpleTestCase):
+    def _dialogue(self, last_user, reply="tell me more about it please"):
+        return [
+            {"role": "user", "content": last_user},
+            {"role": "assistant", "content": reply},
+        ]
+
+    def test_short_messages_are_not_worth_coaching(self):
+        self.assertFalse(views._worth_coaching(self._dialogue("ok thanks")))
+        self.assertTrue(views._worth_coaching(self._dialogue("our price is great")))
+
+    def test_coach_key_covers_the_whole_coach_input(self):
+        summary = {"text": None, "upto": 0}
+        key = views._coach_key(self._dialogue("our price is great"), summary)
+        self.assertEqual(key, views._coach_key(self._dialogue("our price is great"), summary))
+        self.assertNotEqual(key, views._coach_key(self._dialogue("our price is low"), summary))
+        self.assertNotEqual(
+            key, views._coach_key(self._dialogue("our price is great", "too expensive"), summary)
+        )
+        self.assertNotEqual(
+            key, views._coach_key(self._dialogue("our price is great"), {"text": "x", "upto": 2})
+        )
+
+    def test_cached_advice(self):
+        request = SimpleNamespace(session={"coach_key": "k", "coach_advice": "Ask about budget."})
+        self.assertEqual(views._cached_advice(request, "k"), "Ask about budget.")
+        self.assertIsNone(views._cached_advice(request, "other"))
@@ -1,14 +1,31 @@
 # sales_chat/utils.py
 import os
-from openai import OpenAI
+import time
+from functools import lru_cache
+import httpx
+from django.conf import settings
 from django.core.cache import cache
+from openai import OpenAI
 from .models import ChatSetting
 
+# (expires_at, duration) – process-local memo in front of the shared cache;
+# its TTL bounds how long other workers keep an old duration
+_DURATION_CACHE: tuple[float, int] | None = None
+_DURATION_TTL = 60
+
+# shared cache, so the ChatSetting receivers in signals.py invalidate every worker;
+# a per-process cache (locmem) never sees those, so its entry expires too
+SESSION_DURATION_CACHE_KEY = "sales_chat::session_duration"
 
+
+@lru_cache(maxsize=1)
 def get_openai_client() -> OpenAI:
     """
     Return a configured OpenAI client, relying on settings.py
     (which loads the .env file via django‑environ).
+    Built lazily, once per process, so the keep-alive pool is reused
+    across requests. Being lazy also means it is created after gunicorn
+    forks its workers (sockets must not be shared across a fork).
 
     Accepted variable names in .env:
         OPENAI_KEY          (preferred)
@@ -24,24 +41,48 @@ def get_openai_client() -> OpenAI:
             "Add it to your .env file."
         )
 
-    return OpenAI(api_key=api_key)
+    http_client = httpx.Client(
+        limits=httpx.Limits(
+            max_keepalive_connections=32,
+            max_connections=64,
+            keepalive_expiry=60,
+        ),
+        timeout=httpx.Timeout(60.0, connect=10.0),
+    )
+    return OpenAI(api_key=api_key, http_client=http_client)
 
 
 def get_session_duration() -> int:
     """
     Returns the current duration (in seconds).  
-    Cached for 1 minute to avoid a DB hit on every request.
+    Memoised in-process for a minute and kept in the shared cache
+    until a ChatSetting is saved/deleted, so there is no DB hit on
+    the request path after warm-up.
     """
-    cached = cache.get("chat_session_duration")
-    if cached is not None:
-        return cached
-
-    try:
-        duration = ChatSetting.objects.values_list(
-            "session_duration", flat=True
-        ).first()
-    except Exception:
-        duration = 20 * 60          # sane fallback
-
-    cache.set("chat_session_duration", duration, 60)
-    return duration
\ No newline at end of file
+    global _DURATION_CACHE
+    now = time.monotonic()
+    if _DURATION_CACHE is not None and now < _DURATION_CACHE[0]:
+        return _DURATION_CACHE[1]
+
+    duration = cache.get(SESSION_DURATION_CACHE_KEY)
+    if duration is None:
+        try:
+            duration = ChatSetting.objects.values_list(
+                "session_duration", flat=True
+            ).first()
+        except Exception:
+            duration = 20 * 60          # sane fallback
+        cache.set(
+            SESSION_DURATION_CACHE_KEY,
+            duration,
+            None if settings.CACHE_IS_SHARED else _DURATION_TTL,
+        )
+
+    _DURATION_CACHE = (now + _DURATION_TTL, duration)
+    return duration
+
+
+def clear_session_duration_cache() -> None:
+    global _DURATION_CACHE
+    _DURATION_CACHE = None
+    cache.delete(SESSION_DURATION_CACHE_KEY)
@@ -1,13 +1,39 @@
+import time
+
+from django.conf import settings
 from django.core.cache import cache
+
 from .models import Prompt
 
+# key -> (expires_at, text); plain dict in front of the shared cache, so the
+# hot path is a dict lookup. The TTL bounds how long other workers keep an
+# old prompt – the Prompt receivers in signals.py only reach this process.
+_CACHE: dict[str, tuple[float, str]] = {}
+
+# shared cache, so the Prompt receivers in signals.py invalidate every worker;
+# a per-process cache (locmem) never sees those, so its entries expire too
+PROMPT_CACHE_KEY = "sales_chat::prompt::{}"
+
+
 def get_prompt(key: str, fallback: str, ttl_sec: int = 60) -> str:
-    cache_key = f"prompt::{key}"
+    """Prompt text for *key*; memoised for *ttl_sec*, shared until the Prompt changes."""
+    expires_at, text = _CACHE.get(key, (0.0, None))
+    now = time.monotonic()
+    if text is not None and now < expires_at:
+        return text
+
+    cache_key = PROMPT_CACHE_KEY.format(key)
     text = cache.get(cache_key)
     if text is None:
-        try:
-            text = Prompt.objects.get(key=key).content
-        except Prompt.DoesNotExist:
-            text = fallback
-        cache.set(cache_key, text, ttl_sec)
+        text = (
+            Prompt.objects.filter(key=key).values_list("content", flat=True).first()
+            or fallback
+        )
+        cache.set(cache_key, text, None if settings.CACHE_IS_SHARED else ttl_sec)
+    _CACHE[key] = (now + ttl_sec, text)
     return text
+
+
+def clear_prompt_cache() -> None:
+    _CACHE.clear()
+    cache.delete_many([PROMPT_CACHE_KEY.format(key) for key in Prompt.Keys.values])
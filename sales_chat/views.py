@@ -1,14 +1,21 @@
-import csv
-import json
+import atexit
+import hashlib
+import os
+import queue
+import re
+import textwrap
+import threading
 import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
 from pathlib import Path
 
+import orjson
 from django.contrib.auth.decorators import login_required
-from django.core.files.base import ContentFile
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
 from django.shortcuts import render
 from django.utils import timezone
-from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_POST
 
 from .models import Conversation
@@ -19,30 +26,186 @@ from .utils_prompt import get_prompt
 # constants & helpers
 # -------------------------------------------------------------------
 CSV_HEADER = "timestamp,sales person,AI customer,AI assistant coach,clicked\n"
+CSV_HEADER_BYTES = CSV_HEADER.encode("utf-8")
+HISTORY_WINDOW = 12  # newest dialogue messages never folded into the summary
+HISTORY_MAX = 24     # recent dialogue messages kept in memory per conversation
+SSE_MIN_CHUNK = 256  # bytes of reply text collected before an SSE event is sent
+CUSTOMER_MAX_TOKENS = 300  # "1‑3 short paragraphs" – caps worst-case latency
+COACH_MIN_WORDS = 3  # shorter salesperson messages never trigger a coach call
 
 
+# -------------------------------------------------------------------
+# default prompts
+# -------------------------------------------------------------------
+
+def _compact(text: str) -> str:
+    """Dedent, strip and collapse runs of spaces – fewer tokens per request."""
+    return re.sub(r" {2,}", " ", textwrap.dedent(text).strip())
+
+
+DEFAULT_CUSTOMER_PROMPT = _compact("""
+You are playing the role of a potential customer.
+- Act like a real person evaluating a product or service the salesperson proposes.
+- Ask questions, raise objections, or show interest naturally.
+- Keep replies around 1‑3 short paragraphs so the chat flows quickly.
+""")
+
+DEFAULT_COACH_PROMPT = _compact("""
+You are a silent sales coach observing the whole dialogue between a salesperson (the USER)
+and a customer (the ASSISTANT). Give concise, actionable advice ONLY IF it will materially
+improve the next sales move. If the salesperson is doing well, answer exactly:  NO_ADVICE
+""")
+
+
+# -------------------------------------------------------------------
+# CSV logging helpers
+# -------------------------------------------------------------------
+
 def _now():
     """Return local time HH:MM:SS (good enough for this log)."""
     return timezone.localtime().strftime("%H:%M:%S")
 
 
-def _buffer_row(request, *, sales="", customer="", coach="", clicked=""):
-    """Store one CSV row in the session until we flush at session end."""
-    rows = request.session.get("csv_buffer", [])
-    rows.append([_now(), sales, customer, coach, clicked])
-    request.session["csv_buffer"] = rows
-    request.session.modified = True
+# chat_log_path -> raw file descriptor; reused across turns
+_LOG_FILES = {}
+_MAX_LOG_FILES = 64  # oldest handle is closed beyond this (sessions that never ended)
+
+
+def _quote(cell):
+    cell = str(cell)
+    if any(ch in cell for ch in ',"\r\n'):
+        return '"' + cell.replace('"', '""') + '"'
+    return cell
+
+
+def _encode_row(cells):
+    """Same output as csv.writer for our fixed 5-column rows, minus its overhead."""
+    return ",".join(_quote(c) for c in cells) + "\r\n"
+
+
+def _open_log(path):
+    """Return the cached O_APPEND descriptor for *path*, opening it once."""
+    fd = _LOG_FILES.get(path)
+    if fd is None:
+        if len(_LOG_FILES) >= _MAX_LOG_FILES:
+            _close_log(next(iter(_LOG_FILES)))
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        if os.fstat(fd).st_size == 0:  # brand-new log → header first
+            os.write(fd, CSV_HEADER_BYTES)
+        _LOG_FILES[path] = fd
+    return fd
+
+
+def _close_log(path):
+    fd = _LOG_FILES.pop(path, None)
+    if fd is not None:
+        os.close(fd)
+
+
+@atexit.register
+def _close_all_logs():
+    for path in list(_LOG_FILES):
+        _close_log(path)
+
+
+def _append_rows(path, rows, close=False):
+    try:
+        if rows:
+            # one write() per batch: O_APPEND keeps it whole even with
+            # several worker processes appending to the same file
+            data = "".join(_encode_row(r) for r in rows).encode()
+            fd = _open_log(path)
+            while data:
+                data = data[os.write(fd, data):]
+        if close:
+            _close_log(path)
+    except Exception as err:
+        print("CSV write error:", err)
+
+
+# CSV appends happen off the request thread. One writer thread drains the
+# queue, so rows stay in order and it is the only thread touching _LOG_FILES.
+CSV_COALESCE_SEC = 0.05  # rows arriving within this window share one write()
+_CSV_QUEUE = queue.Queue()
+_csv_thread = None
+_csv_thread_lock = threading.Lock()
+
+
+def _write_batch(batch):
+    pending = {}
+    for path, rows, close in batch:
+        pending.setdefault(path, []).extend(rows)
+        if close:
+            _append_rows(path, pending.pop(path), close=True)
+    for path, rows in pending.items():
+        _append_rows(path, rows)
+
+
+def _csv_writer_loop():
+    running = True
+    while running:
+        batch = [_CSV_QUEUE.get()]
+        deadline = time.monotonic() + CSV_COALESCE_SEC
+        while batch[-1] is not None and (left := deadline - time.monotonic()) > 0:
+            try:
+                batch.append(_CSV_QUEUE.get(timeout=left))
+            except queue.Empty:
+                break
+        if batch[-1] is None:  # shutdown sentinel
+            batch.pop()
+            running = False
+        _write_batch(batch)
+
+
+def _enqueue_rows(path, rows, close=False):
+    global _csv_thread
+    # started lazily so it lives in the (forked) worker process
+    with _csv_thread_lock:
+        if _csv_thread is None:
+            _csv_thread = threading.Thread(
+                target=_csv_writer_loop, name="csv-log", daemon=True
+            )
+            _csv_thread.start()
+    _CSV_QUEUE.put((path, rows, close))
+
+
+@atexit.register
+def _stop_csv_writer():
+    # registered after _close_all_logs → runs before it
+    if _csv_thread is not None:
+        _CSV_QUEUE.put(None)
+        _csv_thread.join(timeout=5)
 
 
 def _write_row(request, *, sales="", customer="", coach="", clicked=""):
     path = request.session.get("chat_log_path")
     if not path:
         return
-    try:
-        with open(Path(path), "a", newline="", encoding="utf-8") as fp:
-            csv.writer(fp).writerow([_now(), sales, customer, coach, clicked])
-    except Exception as err:
-        print("CSV write error:", err)
+    _enqueue_rows(path, [[_now(), sales, customer, coach, clicked]])
+
+
+def _read_query(request):
+    """'query' from a JSON body (what chat.js sends), else from form data."""
+    if request.content_type == "application/json":
+        try:
+            return (orjson.loads(request.body).get("query") or "").strip()
+        except (orjson.JSONDecodeError, AttributeError):
+            return ""
+    return request.POST.get("query", "").strip()
+
+
+def _sse_event(payload):
+    # orjson emits UTF-8 bytes directly – no str → bytes re-encode per event
+    return b"data: " + orjson.dumps(payload) + b"\n\n"
+
+
+def _render_transcript(messages):
+    """Compact 'USER: …' / 'CUSTOMER: …' lines – far fewer tokens than JSON."""
+    return "\n".join(
+        f"{'USER' if m['role'] == 'user' else 'CUSTOMER'}: {m['content']}"
+        for m in messages
+    )
 
 
 # -------------------------------------------------------------------
@@ -51,20 +214,16 @@ def _write_row(request, *, sales="", customer="", coach="", clicked=""):
 
 def _session_active(request) -> bool:
     """True if user pressed “Start session” and timer not expired."""
-    if not request.session.get("session_active"):
-        return False
-
-    started_at = request.session.get("session_start")
-    if not started_at:
-        return False
-
-    if time.time() - started_at > get_session_duration():
-        request.session["session_active"] = False
-        request.session["session_finished"] = True
-        request.session.save()
-        return False
-
-    return True
+    # memoised per request – only start_session / end_session change the flags
+    active = getattr(request, "_session_active", None)
+    if active is None:
+        # absolute wall-clock deadline: valid across worker processes, and
+        # natural expiry needs no session write (end_session closes it)
+        deadline = request.session.get("session_deadline")
+        active = bool(request.session.get("session_active") and deadline
+                      and time.time() < deadline)
+        request._session_active = active
+    return active
 
 
 # -------------------------------------------------------------------
@@ -77,33 +236,41 @@ def _ensure_conversation(request):
     # 1) cached in this browser session? -------------------------
     conv_id = request.session.get("conversation_id")
     if conv_id:
-        try:
-            return Conversation.objects.get(id=conv_id)
-        except Conversation.DoesNotExist:
-            pass  # stale ID → continue
+        conv = Conversation.objects.filter(id=conv_id).only("id", "log_file").first()
+        if conv:
+            return conv
+        # stale ID → continue
 
     # 2) reuse existing Conversation row for this user -----------
     existing = getattr(request.user, "sales_conversation", None)
     if existing:
         request.session["conversation_id"] = existing.id
         request.session["chat_log_path"] = existing.log_file.path
-        request.session.save()
         return existing
 
     # 3) first‑ever run for this user → create the CSV ----------
     now = timezone.localtime()
     filename = f"{request.user.username}_{now:%Y-%m-%d_%H-%M-%S}.csv"
 
-    conv = Conversation.objects.create(user=request.user)
-    conv.log_file.save(filename, ContentFile(CSV_HEADER))
+    # only reserve the name here; the file (header included) is written
+    # together with the first row, see _open_log()
+    conv = Conversation(user=request.user)
+    conv.log_file.name = conv.log_file.field.generate_filename(conv, filename)
     conv.save()
 
     request.session["conversation_id"] = conv.id
     request.session["chat_log_path"] = conv.log_file.path
-    request.session.save()
     return conv
 
 
+def _ensure_conversation_id(request) -> int:
+    """Like _ensure_conversation, but skips the DB when the session already knows the CSV."""
+    conv_id = request.session.get("conversation_id")
+    if conv_id and request.session.get("chat_log_path"):
+        return conv_id
+    return _ensure_conversation(request).id
+
+
 # -------------------------------------------------------------------
 # UI page
 # -------------------------------------------------------------------
@@ -116,120 +283,146 @@ def chat_room(request):
 # -------------------------------------------------------------------
 # start / end session endpoints
 # -------------------------------------------------------------------
-@csrf_exempt
 @require_POST
 @login_required
 def start_session(request):
     # Hard rule: 1 session (CSV) per user, lifetime
     if Conversation.objects.filter(user=request.user).exists():
-        return JsonResponse({"error": "already-finished"}, status=403)
+        return JsonResponse({"error": "already-finished"}, status=409)
 
     # wipe everything from a previous attempt in this browser session
     for key in (
         "conversation_id",
         "chat_log_path",
-        "csv_buffer",
-        "sales_chat_history",
+        "advice_clickable",
+        "history_summary",
+        "coach_key",
+        "coach_advice",
     ):
         request.session.pop(key, None)
 
     _ensure_conversation(request)
 
+    duration = get_session_duration()
     request.session["session_active"] = True
-    request.session["session_start"] = int(time.time())
-    request.session.save()
+    request.session["session_deadline"] = time.time() + duration
 
-    return JsonResponse({"status": "started", "duration": get_session_duration()})
+    return JsonResponse({"status": "started", "duration": duration})
 
 
-@csrf_exempt
 @require_POST
 @login_required
 def end_session(request):
-    rows = request.session.pop("csv_buffer", [])
     path = request.session.get("chat_log_path")
-
-    if rows and path:
-        with open(Path(path), "a", newline="", encoding="utf-8") as fp:
-            csv.writer(fp).writerows(rows)
+    if path:
+        _enqueue_rows(path, [], close=True)  # release the descriptor
 
     request.session["session_active"] = False
     request.session["session_finished"] = True
-    request.session.modified = True
-    request.session.save()
     return JsonResponse({"status": "ended"})
 
 
 # -------------------------------------------------------------------
-# customer endpoint – sales person ↔︎ AI customer
+# history store
+#   dialogue messages are appended to <log>.msgs.jsonl next to the CSV;
+#   the log itself is the source of truth – its size validates the cache
 # -------------------------------------------------------------------
 
+# msgs path -> (log size in bytes, message count, deque of the last HISTORY_MAX messages)
+_HISTORY_CACHE = {}
+_MAX_HISTORY_CACHE = 256
 
-@csrf_exempt
-@require_POST
-@login_required
-def chat_stream(request):
-    if not _session_active(request):
-        return JsonResponse({"error": "inactive"}, status=403)
 
-    user_text = request.POST.get("query", "").strip()
-    if not user_text:
-        return JsonResponse({"error": "empty"}, status=400)
+def _msgs_path(request):
+    return Path(request.session["chat_log_path"]).with_suffix(".msgs.jsonl")
 
-    _ensure_conversation(request)
 
-    _write_row(request, sales=user_text)
+def _load_history(request):
+    """(message count, recent messages) – from memory unless the log grew elsewhere."""
+    path = _msgs_path(request)
+    try:
+        size = path.stat().st_size
+    except FileNotFoundError:
+        size = 0
+    entry = _HISTORY_CACHE.get(path)
+    if entry is None or entry[0] != size:
+        lines = []
+        if size:
+            with open(path, "rb") as fp:
+                data = fp.read(size)
+            # a line another worker is still appending is picked up next time
+            size = data.rfind(b"\n") + 1
+            lines = data[:size].splitlines()
+        recent = deque((orjson.loads(line) for line in lines[-HISTORY_MAX:]), maxlen=HISTORY_MAX)
+        if len(_HISTORY_CACHE) >= _MAX_HISTORY_CACHE:
+            del _HISTORY_CACHE[next(iter(_HISTORY_CACHE))]
+        entry = _HISTORY_CACHE[path] = (size, len(lines), recent)
+    return entry[1], entry[2]
+
+
+def _append_history(request, *messages):
+    count, recent = _load_history(request)
+    path = _msgs_path(request)
+    size = _HISTORY_CACHE[path][0]
+    data = b"".join(orjson.dumps(m) + b"\n" for m in messages)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "ab") as fp:
+        fp.write(data)
+    recent.extend(messages)
+    # if another worker appended meanwhile, the size won't match → re-read
+    _HISTORY_CACHE[path] = (size + len(data), count + len(messages), recent)
 
-    # build chat history (system prompt only once)
-    history = request.session.get("sales_chat_history", [])
-    if not history:
-        system_prompt = get_prompt("CUSTOMER_PROMPT", DEFAULT_CUSTOMER_PROMPT)
-        history.append({"role": "system", "content": system_prompt})
 
-    history.append({"role": "user", "content": user_text})
+# -------------------------------------------------------------------
+# running summary of the oldest turns
+# -------------------------------------------------------------------
 
-    client = get_openai_client()
-    response = client.chat.completions.create(
-        model="gpt-4o",
-        messages=history,
-        temperature=0.7,
-        stream=False,
-    )
-    full_reply = response.choices[0].message.content
+# coach / summary calls that run next to the customer stream
+_LLM_POOL = ThreadPoolExecutor(max_workers=8, thread_name_prefix="llm")
+
+SUMMARY_CHUNK = 10  # messages past HISTORY_WINDOW that trigger one summary call
+SUMMARY_PREFIX = "Summary so far: "
 
-    time.sleep(min(max(len(full_reply.split()) * 0.2, 0.5), 8.0))
 
-    history.append({"role": "assistant", "content": full_reply})
-    request.session["sales_chat_history"] = history
-    request.session.save()
+def _unsummarised(dialogue, total, upto):
+    """Tail of *dialogue* (ending at message number *total*) not in the summary yet."""
+    return dialogue[max(upto - (total - len(dialogue)), 0):]
 
-    _write_row(request, customer=full_reply)
 
-    return JsonResponse({"answer": full_reply}, json_dumps_params={"ensure_ascii": False})
+def _summarize(path, start, stop, previous):
+    """Fold log messages [start, stop) into the *previous* summary text (or None on error)."""
+    try:
+        # read from the log, not the in-memory tail: after failed summaries
+        # the unsummarised span can be longer than HISTORY_MAX
+        with open(path, "rb") as fp:
+            dropped = [orjson.loads(line) for line in islice(fp, start, stop)]
+        transcript = _render_transcript(dropped)
+        if previous:
+            transcript = previous + "\n" + transcript
+        client = get_openai_client()
+        response = client.chat.completions.create(
+            model="gpt-4.1-mini",
+            max_tokens=200,
+            messages=[
+                {"role": "system", "content": "Summarize briefly for context continuation."},
+                {"role": "user", "content": transcript},
+            ],
+        )
+        return response.choices[0].message.content.strip()
+    except Exception as err:
+        print("Summary‑LLM error:", err)
+        return None
 
 
 # -------------------------------------------------------------------
-# coach advice – NO system prompt leakage
+# coach helpers – NO system prompt leakage
 # -------------------------------------------------------------------
 
-@csrf_exempt
-@require_POST
-@login_required
-def coach_advice(request):
-    if not _session_active(request):
-        return JsonResponse({"error": "inactive"}, status=403)
-
-    full_history: list[dict] = request.session.get("sales_chat_history", [])
-
-    # Strip system‑level messages so the coach only sees the real dialogue
-    dialogue_only = [m for m in full_history if m["role"] != "system"]
-
-    if len(dialogue_only) < 2:
-        return JsonResponse({"advice": "🕒 Say hello to the customer and I'll jump in!"})
-
-    trimmed_history = dialogue_only[-12:]
-    coach_prompt = get_prompt("COACH_PROMPT", DEFAULT_COACH_PROMPT)
-
+def _ask_coach(dialogue, coach_prompt, summary=None):
+    """Return the raw coach answer for the summary + the unsummarised messages."""
+    transcript = _render_transcript(dialogue)
+    if summary:
+        transcript = SUMMARY_PREFIX + summary + "\n" + transcript
     try:
         client = get_openai_client()
         response = client.chat.completions.create(
@@ -241,60 +434,217 @@ def coach_advice(request):
                 {
                     "role": "user",
                     "content": (
-                        "Conversation transcript:\n" +
-                        json.dumps(trimmed_history, ensure_ascii=False)
+                        "Conversation transcript:\n" + transcript
                     ),
                 },
             ],
         )
-        advice_text = response.choices[0].message.content.strip()
+        return response.choices[0].message.content.strip()
     except Exception as err:
         print("Coach‑LLM error:", err)
-        advice_text = "⚠️ Coach temporarily unavailable – please continue."
+        return "⚠️ Coach temporarily unavailable – please continue."
+
+
+def _worth_coaching(dialogue):
+    """False when the salesperson's last message is too short ("ok", "thanks" …)."""
+    last_user = next((m["content"] for m in reversed(dialogue) if m["role"] == "user"), "")
+    return len(last_user.split()) >= COACH_MIN_WORDS
+
+
+def _coach_key(recent, summary):
+    """Hash of exactly what the coach sees: summary position + unsummarised dialogue."""
+    return hashlib.blake2b(orjson.dumps([summary["upto"], recent]), digest_size=8).hexdigest()
 
-    advice_visible = ""
+
+def _cached_advice(request, key):
+    """Advice to return without an LLM call, or None if the coach has to run."""
+    if key == request.session.get("coach_key"):
+        advice = request.session.get("coach_advice", "")
+        if advice:  # shown again → a click on it is logged again
+            request.session["advice_clickable"] = True
+        return advice
+    return None
+
+
+def _visible_advice(request, advice_text, key):
+    """Log advice worth showing to the CSV and return it ("" for NO_ADVICE)."""
+    visible = ""
     if advice_text and not advice_text.upper().startswith("NO_ADVICE"):
-        advice_visible = advice_text
-        _buffer_row(request, coach=advice_text, clicked="false")
+        _write_row(request, coach=advice_text, clicked="false")
+        request.session["advice_clickable"] = True
+        visible = advice_text
+    request.session["coach_key"] = key
+    request.session["coach_advice"] = visible
+    return visible
+
+
+# -------------------------------------------------------------------
+# customer endpoints – sales person ↔︎ AI customer
+# -------------------------------------------------------------------
+
+def _customer_reply(request, *, with_coach):
+    if not _session_active(request):
+        return JsonResponse({"error": "inactive"}, status=409)
+
+    user_text = _read_query(request)
+    if not user_text:
+        return JsonResponse({"error": "empty"}, status=400)
+
+    _ensure_conversation_id(request)
+
+    _write_row(request, sales=user_text)
 
-    return JsonResponse({"advice": advice_visible})
+    user_msg = {"role": "user", "content": user_text}
+    count, history = _load_history(request)
+    dialogue = [*history, user_msg]
+    total = count + 1
+    summary = request.session.get("history_summary") or {"text": None, "upto": 0}
+    recent = _unsummarised(dialogue, total, summary["upto"])
+
+    # the coach judges the salesperson's latest move while the customer answers
+    coach_future = advice = None
+    if with_coach and not _worth_coaching(dialogue):
+        advice = ""  # nothing to coach
+    elif with_coach:
+        coach_key = _coach_key(recent, summary)
+        advice = _cached_advice(request, coach_key)
+        if advice is None:
+            coach_prompt = get_prompt("COACH_PROMPT", DEFAULT_COACH_PROMPT)
+            coach_future = _LLM_POOL.submit(_ask_coach, recent, coach_prompt, summary["text"])
+
+    # long conversation → fold everything older than the window into the
+    # summary in the background; this turn still sends it verbatim
+    summary_future = None
+    if total - HISTORY_WINDOW - summary["upto"] >= SUMMARY_CHUNK:
+        summary_upto = total - HISTORY_WINDOW
+        summary_future = _LLM_POOL.submit(
+            _summarize, _msgs_path(request), summary["upto"], summary_upto, summary["text"]
+        )
+
+    messages = [{"role": "system", "content": get_prompt("CUSTOMER_PROMPT", DEFAULT_CUSTOMER_PROMPT)}]
+    if summary["text"]:
+        messages.append({"role": "system", "content": SUMMARY_PREFIX + summary["text"]})
+
+    client = get_openai_client()
+    stream = client.chat.completions.create(
+        model="gpt-4o",
+        # system prompt + summary + unsummarised turns → bounded prompt size
+        messages=messages + recent,
+        temperature=0.7,
+        max_tokens=CUSTOMER_MAX_TOKENS,
+        stop=["\n\n\n"],  # no runaway blank padding
+        stream=True,
+    )
+
+    def sse():
+        full_reply = ""
+        buf = ""
+        try:
+            for chunk in stream:
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content or ""
+                full_reply += delta
+                buf += delta
+                # batch tiny deltas → fewer chunked-encoding frames
+                if len(buf) >= SSE_MIN_CHUNK or buf.endswith((".", "\n")):
+                    yield _sse_event({"t": buf})
+                    buf = ""
+        except Exception as err:
+            print("Customer-LLM stream error:", err)
+            yield _sse_event({"error": "stream"})
+        if buf:
+            yield _sse_event({"t": buf})
+
+        _append_history(request, user_msg, {"role": "assistant", "content": full_reply})
+        if summary_future is not None and (summary_text := summary_future.result()):
+            request.session["history_summary"] = {"text": summary_text, "upto": summary_upto}
+        _write_row(request, customer=full_reply)
+
+        final_advice = advice
+        if coach_future is not None:
+            final_advice = _visible_advice(request, coach_future.result(), coach_key)
+
+        # SessionMiddleware has already run by now → save explicitly, before
+        # the last yield: a client that disconnects there must not skip it
+        request.session.save()
+
+        if final_advice is not None:
+            yield _sse_event({"advice": final_advice})
+
+    response = StreamingHttpResponse(sse(), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"  # don't let nginx buffer the stream
+    return response
+
+
+@require_POST
+@login_required
+def chat_stream(request):
+    return _customer_reply(request, with_coach=False)
+
+
+@require_POST
+@login_required
+def chat_turn(request):
+    """One round-trip per message: customer stream + coach advice computed in parallel."""
+    return _customer_reply(request, with_coach=True)
 
 
 # -------------------------------------------------------------------
-# mark advice as clicked
+# coach advice
 # -------------------------------------------------------------------
 
-@csrf_exempt
 @require_POST
 @login_required
-def coach_clicked(request):
+def coach_advice(request):
     if not _session_active(request):
-        return JsonResponse({"error": "inactive"}, status=403)
+        return JsonResponse({"error": "inactive"}, status=409)
 
-    rows = request.session.get("csv_buffer", [])
-    if not rows:
-        return JsonResponse({"status": "no-data"}, status=400)
+    count, dialogue = 0, []
+    if request.session.get("chat_log_path"):
+        count, history = _load_history(request)
+        dialogue = list(history)
 
-    rows[-1][4] = "true"  # clicked column
-    request.session["csv_buffer"] = rows
-    request.session.modified = True
+    if len(dialogue) < 2:
+        return JsonResponse({"advice": "🕒 Say hello to the customer and I'll jump in!"})
 
-    return JsonResponse({"status": "ok"})
+    if not _worth_coaching(dialogue):
+        return JsonResponse({"advice": ""})
+
+    summary = request.session.get("history_summary") or {"text": None, "upto": 0}
+    recent = _unsummarised(dialogue, count, summary["upto"])
+    key = _coach_key(recent, summary)
+    advice = _cached_advice(request, key)
+    if advice is not None:
+        return JsonResponse({"advice": advice})
+
+    coach_prompt = get_prompt("COACH_PROMPT", DEFAULT_COACH_PROMPT)
+    advice_text = _ask_coach(recent, coach_prompt, summary["text"])
+
+    return JsonResponse({"advice": _visible_advice(request, advice_text, key)})
 
 
 # -------------------------------------------------------------------
-# default prompts
+# mark advice as clicked
 # -------------------------------------------------------------------
 
-DEFAULT_CUSTOMER_PROMPT = """
-You are playing the role of a potential customer.
-- Act like a real person evaluating a product or service the salesperson proposes.
-- Ask questions, raise objections, or show interest naturally.
-- Keep replies around 1‑3 short paragraphs so the chat flows quickly.
-"""
+@require_POST
+@login_required
+def coach_clicked(request):
+    if not _session_active(request):
+        return JsonResponse({"error": "inactive"}, status=409)
+
+    clickable = request.session.get("advice_clickable")
+    if clickable is None:
+        return JsonResponse({"status": "no-data"}, status=400)
+
+    # the advice row is already on disk → log the click as its own
+    # "<time>,,,,true" row, referring to the latest advice above it;
+    # the admin download folds it back in (admin.resolved_log_rows)
+    if clickable:
+        _write_row(request, clicked="true")
+        request.session["advice_clickable"] = False
+
+    return JsonResponse({"status": "ok"})
 
-DEFAULT_COACH_PROMPT = """
-You are a silent sales coach observing the whole dialogue between a salesperson (the USER)
-and a customer (the ASSISTANT). Give concise, actionable advice ONLY IF it will materially
-improve the next sales move. If the salesperson is doing well, answer exactly:  NO_ADVICE
-"""
@@ -0,0 +1,16 @@
+from django.middleware.gzip import GZipMiddleware
+
+
+class StreamFriendlyGZipMiddleware(GZipMiddleware):
+    """
+    GZipMiddleware that leaves Server-Sent Events alone.
+
+    Django compresses a streaming body through one GzipFile that is only
+    flushed at the end, so every SSE event would reach the browser at once
+    when the stream closes.
+    """
+
+    def process_response(self, request, response):
+        if response.get("Content-Type", "").startswith("text/event-stream"):
+            return response
+        return super().process_response(request, response)
@@ -56,6 +56,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'voice_assistant_project.middleware.StreamFriendlyGZipMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -100,6 +101,25 @@ DATABASES = {
 }
 
 
+# Cache
+# e.g. CACHE_URL=redis://127.0.0.1:6379/1 (needs the "redis" package)
+#   or CACHE_URL=pymemcache://127.0.0.1:11211 (django-environ maps it to PyLibMCCache,
+#   which needs the "pylibmc" package)
+# Use a shared cache in production: sessions are read from it on every request,
+# and admin edits to prompts / session length invalidate it for all workers
+# (with locmem, other workers pick such edits up within two minutes).
+
+CACHES = {
+    'default': env.cache_url('CACHE_URL', default='locmemcache://'),
+}
+
+# locmem / dummy caches live inside one process: the other workers never see
+# their writes, so nothing that must stay consistent across workers goes there
+CACHE_IS_SHARED = not CACHES['default']['BACKEND'].endswith(
+    ('.LocMemCache', '.DummyCache')
+)
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
@@ -158,6 +178,13 @@ MEDIA_URL  = "/media/"
 #make sure nothing is stored once browser is closed
 SESSION_EXPIRE_AT_BROWSER_CLOSE = True
 
+# with a shared cache, sessions are read from it and the DB is only the durable
+# fallback; a per-process cache would serve other workers' stale copies
+SESSION_ENGINE = (
+    'django.contrib.sessions.backends.cached_db' if CACHE_IS_SHARED
+    else 'django.contrib.sessions.backends.db'
+)
+
 
 # create hashed static files
 #STORAGES = {